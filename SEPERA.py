@@ -4,16 +4,36 @@ Title: Development, multi-institutional validation, and algorithmic audit of SEP
 """
 
 # Import packages and libraries
+import io
 import pandas as pd
 import numpy as np
 import PIL.Image
 import streamlit as st
-import joblib
-from pathlib import Path
 from PIL import ImageFont, ImageDraw, ImageOps
-from google_drive_downloader import GoogleDriveDownloader as gdd
 from persist import persist, load_widget_state
 
+# Model features, in the order the model was trained on
+FEATURES = ['Age at Biopsy', 'Worst Gleason Grade Group', 'PSA density', 'Perineural invasion', '% positive cores',
+            '% Gleason pattern 4/5', 'Max % core involvement', 'Base finding', 'Base % core involvement',
+            'Mid % core involvement', 'Apex % core involvement']
+
+# Columns of the reference data used to find patients with similar characteristics
+SIMILAR_CASE_COLUMNS = FEATURES[:7] + ['ssEPE']
+
+# Widest image Streamlit displays without resizing and re-encoding it
+DISPLAY_WIDTH = 1460
+
+# Colour coded site images pasted onto the prostate diagram as (site, side, paste location, transform), the right base
+# and apex images are mirrored versions of the left ones
+PASTES = (('Base', 'L', (495, 1615), 'identity'),
+          ('Mid', 'L', (495, 965), 'identity'),
+          ('Apex', 'L', (495, 187), 'identity'),
+          ('Base', 'R', (1665, 1615), 'mirror'),
+          ('Mid', 'R', (1665, 965), 'identity'),
+          ('Apex', 'R', (1665, 187), 'mirror'))
+SPRITE_FILES = {'Base': 'Images/Base {}.png', 'Mid': 'Images/Mid {}.png', 'Apex': 'Images/Apex {}.png'}
+TRANSFORMS = {'identity': lambda sprite: sprite, 'mirror': ImageOps.mirror}
+
 def main():
     if "page" not in st.session_state:
         # Initialize session state.
@@ -44,7 +64,11 @@ def page_sepera():
     )
 
     # Specify font size for annotated prostate diagram
-    font = ImageFont.truetype('Images/Font.ttf', 80)
+    @st.cache(allow_output_mutation=True)
+    def get_font():
+        return ImageFont.truetype('Images/Font.ttf', 80)
+
+    font = get_font()
 
     # Load saved items from Google Drive
     Model_location = st.secrets['SEPERA']
@@ -52,31 +76,86 @@ def page_sepera():
 
     @st.cache(allow_output_mutation=True)
     def load_items():
-        save_dest = Path('model')
-        save_dest.mkdir(exist_ok=True)
-        model_checkpoint = Path('model/SEPERA.pkl')
-        data_checkpoint = Path('model/data.pkl')
-
-        # download from Google Drive if model or features are not present
-        if not model_checkpoint.exists():
-            with st.spinner("Downloading ... this may take awhile! \n Don't stop it!"):
-                gdd.download_file_from_google_drive(Model_location, model_checkpoint)
-        if not data_checkpoint.exists():
-            with st.spinner("Downloading ... this may take awhile! \n Don't stop it!"):
-                gdd.download_file_from_google_drive(Data_location, data_checkpoint)
+        # Only needed to load the model and data, so the About page never imports them
+        import joblib
+        from prebuild import download_items
+
+        # download from Google Drive if model or features are not present (prebuild.py fetches them ahead of time)
+        with st.spinner("Downloading ... this may take awhile! \n Don't stop it!"):
+            model_checkpoint, data_checkpoint = download_items(Model_location, Data_location)
 
         model = joblib.load(model_checkpoint)
         data = joblib.load(data_checkpoint)
-        return model, data
 
-    model, data = load_items()
+        # Keep contiguous arrays of the columns used by the similar case finder, so that each query compares arrays
+        # instead of indexing the DataFrame
+        cases = {column: np.ascontiguousarray(data[column].to_numpy()) for column in SIMILAR_CASE_COLUMNS}
+        return model, cases
+
+    model, cases = load_items()
+
+    # Find patients from our database with similar characteristics, returns the number of them with ssEPE and the
+    # number of similar patients
+    def between(values, low, high):
+        return (values >= low) & (values <= high)
+
+    def find_similar_cases(pt_row):
+        pt = dict(zip(FEATURES, pt_row))
+        similar = (between(cases['Age at Biopsy'], pt['Age at Biopsy'] - 5, pt['Age at Biopsy'] + 5) &
+                   (cases['Worst Gleason Grade Group'] == pt['Worst Gleason Grade Group']) &
+                   between(cases['PSA density'], pt['PSA density'] * 0.7, pt['PSA density'] * 1.3) &
+                   (cases['Perineural invasion'] == pt['Perineural invasion']) &
+                   between(cases['% positive cores'], pt['% positive cores'] - 10, pt['% positive cores'] + 10) &
+                   between(cases['% Gleason pattern 4/5'], pt['% Gleason pattern 4/5'] - 10,
+                           pt['% Gleason pattern 4/5'] + 10) &
+                   between(cases['Max % core involvement'], pt['Max % core involvement'] - 10,
+                           pt['Max % core involvement'] + 10))
+        return cases['ssEPE'][similar].sum(), int(similar.sum())
+
+    # Assemble the features of one lobe into an array, in the order of FEATURES, using the worst site finding and
+    # highest % core involvement across the base, mid and apex
+    def build_features(age, psa, vol, p_high, perineural_inv, base_findings, mid_findings, apex_findings, base_p_inv,
+                       mid_p_inv, apex_p_inv, pos_core, taken_core):
+        return np.array([age,
+                         max(base_findings, mid_findings, apex_findings),
+                         psa / vol,
+                         perineural_inv,
+                         (pos_core / taken_core) * 100,
+                         p_high,
+                         max(base_p_inv, mid_p_inv, apex_p_inv),
+                         base_findings,
+                         base_p_inv,
+                         mid_p_inv,
+                         apex_p_inv], dtype=np.float64)
+
+    # Predict both lobes in a single batch, only called from render_results() which memoizes the results
+    def predict_ssepe(model, features):
+        return model.predict_proba(pd.DataFrame(features, columns=FEATURES))[:, 1]
+
+    # Load blank prostate as image objects from GitHub repository, the cached diagram is copied before annotating
+    # so that pasting never modifies the cached object
+    @st.cache(allow_output_mutation=True)
+    def load_base_prostate():
+        with PIL.Image.open('Images/Prostate diagram.png') as image:
+            return image.convert('RGBA')
 
-    # Load blank prostate as image objects from GitHub repository
-    def load_images():
-        image = PIL.Image.open('Images/Prostate diagram.png')
-        return image
+    base_image = load_base_prostate()
 
-    image = load_images()
+    # Load colour coded site images once for each grade, with the transform of PASTES already applied. Each image is
+    # cropped to its non-transparent area and stored with the offset of that area, so pasting skips transparent pixels
+    @st.cache(allow_output_mutation=True)
+    def load_sprites():
+        sprites = {}
+        for site, side, xy, transform in PASTES:
+            for grade in range(1, 6):
+                if (site, transform, grade) not in sprites:
+                    with PIL.Image.open(SPRITE_FILES[site].format(grade)) as sprite:
+                        sprite = TRANSFORMS[transform](sprite.convert('RGBA'))
+                    bbox = sprite.getchannel('A').getbbox() or (0, 0) + sprite.size
+                    sprites[(site, transform, grade)] = (sprite.crop(bbox), bbox[:2])
+        return sprites
+
+    sprites = load_sprites()
 
     # Define choices and labels for feature inputs
     CHOICES = {0: 'No', 1: 'Yes', -1: 'Unknown'}
@@ -95,6 +174,105 @@ def page_sepera():
     def format_func_gleason(option):
         return G_CHOICES[option]
 
+    # Memoize the results on the user inputs so that repeated submits skip the model, the similar case finder and
+    # drawing the annotated prostate diagram, which is returned as PNG bytes. The cache is shared by all sessions,
+    # so only the most recent inputs are kept
+    @st.experimental_memo(show_spinner=False, max_entries=32, ttl=3600)
+    def render_results(_model, inputs):
+        (age, psa, vol, p_high, perineural_inv, base_findings, base_p_inv, mid_findings, mid_p_inv, apex_findings,
+         apex_p_inv, pos_core, taken_core, base_findings_r, base_p_inv_r, mid_findings_r, mid_p_inv_r, apex_findings_r,
+         apex_p_inv_r, pos_core_r, taken_core_r) = inputs
+
+        ### DATA STORAGE ###
+        # Store the left and right lobe features into arrays
+        pt_row = build_features(age, psa, vol, p_high, perineural_inv, base_findings, mid_findings,
+                                apex_findings, base_p_inv, mid_p_inv, apex_p_inv, pos_core, taken_core)
+        pt_row_r = build_features(age, psa, vol, p_high, perineural_inv, base_findings_r, mid_findings_r,
+                                  apex_findings_r, base_p_inv_r, mid_p_inv_r, apex_p_inv_r, pos_core_r,
+                                  taken_core_r)
+
+        # Predict both lobes in one call, the model only sees a DataFrame for its feature names. XGBoost holds its
+        # inputs as float32, so downcasting here saves a conversion without changing the predictions
+        pt_features = np.stack([pt_row, pt_row_r]).astype(np.float32)
+        p_both = predict_ssepe(_model, pt_features)
+        left_p = p_both[0:1]
+        right_p = p_both[1:2]
+
+        ### ANNOTATED PROSTATE DIAGRAM ###
+        # Create text to overlay on annotated prostate diagram, auto-updates based on user inputted values
+        if base_findings <= 0 or base_p_inv <= 0:
+            base_L = str(G_CHOICES[base_findings]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            base_L = str(G_CHOICES[base_findings]) + '\n' \
+                 + '% core involvement: ' + str(base_p_inv)
+        if mid_findings <= 0 or mid_p_inv <= 0:
+            mid_L = str(G_CHOICES[mid_findings]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            mid_L = str(G_CHOICES[mid_findings]) + '\n' \
+                 + '% core involvement: ' + str(mid_p_inv)
+        if apex_findings <= 0 or apex_p_inv <= 0:
+            apex_L = str(G_CHOICES[apex_findings]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            apex_L = str(G_CHOICES[apex_findings]) + '\n' \
+                 + '% core involvement: ' + str(apex_p_inv)
+
+        if base_findings_r <= 0 or base_p_inv_r <= 0:
+            base_R = str(G_CHOICES[base_findings_r]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            base_R = str(G_CHOICES[base_findings_r]) + '\n' \
+                 + '% core involvement: ' + str(base_p_inv_r)
+        if mid_findings_r <= 0 or mid_p_inv_r <= 0:
+            mid_R = str(G_CHOICES[mid_findings_r]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            mid_R = str(G_CHOICES[mid_findings_r]) + '\n' \
+                 + '% core involvement: ' + str(mid_p_inv_r)
+        if apex_findings_r <= 0 or apex_p_inv_r <= 0:
+            apex_R = str(G_CHOICES[apex_findings_r]) + '\n' \
+                 + '% core involvement: n/a'
+        else:
+            apex_R = str(G_CHOICES[apex_findings_r]) + '\n' \
+                 + '% core involvement: ' + str(apex_p_inv_r)
+
+        # Show colour coded site images based on Gleason Grade Group for each site, only copying the blank
+        # prostate once the inputs are valid
+        image = base_image.copy()
+        draw = ImageDraw.Draw(image)
+        grades = {('Base', 'L'): base_findings, ('Mid', 'L'): mid_findings, ('Apex', 'L'): apex_findings,
+                  ('Base', 'R'): base_findings_r, ('Mid', 'R'): mid_findings_r, ('Apex', 'R'): apex_findings_r}
+        for site, side, xy, transform in PASTES:
+            entry = sprites.get((site, transform, grades[(site, side)]))
+            if entry is not None:
+                sprite, offset = entry
+                image.paste(sprite, (xy[0] + offset[0], xy[1] + offset[1]), mask=sprite)
+
+        # Overlay text showing Gleason Grade Group, % positive cores, and % core involvement for each site
+        draw.text((655, 1920), base_L, fill="black", font=font, align="center")
+        draw.text((655, 1190), mid_L, fill="black", font=font, align="center")
+        draw.text((735, 545), apex_L, fill="black", font=font, align="center")
+        draw.text((1850, 1920), base_R, fill="black", font=font, align="center")
+        draw.text((1850, 1190), mid_R, fill="black", font=font, align="center")
+        draw.text((1770, 545), apex_R, fill="black", font=font, align="center")
+
+        ### SIMILAR CASE FINDER ###
+        pos_ssEPE, similar_cases = find_similar_cases(pt_row)
+        pos_ssEPE_r, similar_cases_r = find_similar_cases(pt_row_r)
+
+        # The diagram is drawn at 3162x3024, shrink it to DISPLAY_WIDTH so that Streamlit sends the PNG as is. The PNG
+        # is only sent to the browser once, so a fast compression level is used. Both images are closed once encoded
+        # to release their pixel memory rather than leaving it for the garbage collector
+        buffer = io.BytesIO()
+        display_image = image.resize((DISPLAY_WIDTH, int(image.height * DISPLAY_WIDTH / image.width)),
+                                     resample=PIL.Image.BILINEAR, reducing_gap=2.0)
+        image.close()
+        display_image.save(buffer, format='PNG', compress_level=1, optimize=False)
+        display_image.close()
+        return left_p, right_p, pos_ssEPE, similar_cases, pos_ssEPE_r, similar_cases_r, buffer.getvalue()
+
     # Input individual values in sidebar
     st.header("Enter Your Information")
     if st.button('Click here if you have received hormone therapy or radiation therapy for prostate cancer before your '
@@ -156,251 +334,22 @@ def page_sepera():
                            "")
 
             else:
-                ### LEFT DATA STORAGE ###
-                # Group site findings into a list
-                gleason_t = [base_findings, mid_findings, apex_findings]
-
-                # Group % core involvements at each site into a list
-                p_inv_t = [base_p_inv, mid_p_inv, apex_p_inv]
-
-                # Combine site findings and % core involvements into a pandas DataFrame and sort by descending Gleason
-                # then descending % core involvement
-                g_p_inv = pd.DataFrame({'Gleason': gleason_t, '% core involvement': p_inv_t})
-                sort_g_p_inv = g_p_inv.sort_values(by=['Gleason', '% core involvement'], ascending=False)
-
-                # Store a dictionary into a variable
-                pt_data = {'Age at Biopsy': age,
-                           'Worst Gleason Grade Group': sort_g_p_inv['Gleason'].max(),
-                           'PSA density': psa / vol,
-                           'Perineural invasion': perineural_inv,
-                           '% positive cores': (pos_core / taken_core) * 100,
-                           '% Gleason pattern 4/5': p_high,
-                           'Max % core involvement': sort_g_p_inv['% core involvement'].max(),
-                           'Base finding': base_findings,
-                           'Base % core involvement': base_p_inv,
-                           'Mid % core involvement': mid_p_inv,
-                           'Apex % core involvement': apex_p_inv
-                           }
-
-                pt_features = pd.DataFrame(pt_data, index=[0])
-
-                ### RIGHT DATA STORAGE ###
-                # Group site findings into a list
-                gleason_t_r = [base_findings_r, mid_findings_r, apex_findings_r]
-
-                # Group % core involvements at each site into a list
-                p_inv_t_r = [base_p_inv_r, mid_p_inv_r, apex_p_inv_r]
-
-                # Combine site findings and % core involvements into a pandas DataFrame and sort by descending Gleason
-                # then descending % core involvement
-                g_p_inv_r = pd.DataFrame({'Gleason': gleason_t_r, '% core involvement': p_inv_t_r})
-                sort_g_p_inv_r = g_p_inv_r.sort_values(by=['Gleason', '% core involvement'], ascending=False)
-
-                # Store a dictionary into a variable
-                pt_data_r = {'Age at Biopsy': age,
-                             'Worst Gleason Grade Group': sort_g_p_inv_r['Gleason'].max(),
-                             'PSA density': psa / vol,
-                             'Perineural invasion': perineural_inv,
-                             '% positive cores': (pos_core_r / taken_core_r) * 100,
-                             '% Gleason pattern 4/5': p_high,
-                             'Max % core involvement': sort_g_p_inv_r['% core involvement'].max(),
-                             'Base finding': base_findings_r,
-                             'Base % core involvement': base_p_inv_r,
-                             'Mid % core involvement': mid_p_inv_r,
-                             'Apex % core involvement': apex_p_inv_r
-                             }
-
-                pt_features_r = pd.DataFrame(pt_data_r, index=[0])
-
-                ### ANNOTATED PROSTATE DIAGRAM ###
-                # Create text to overlay on annotated prostate diagram, auto-updates based on user inputted values
-                if base_findings <= 0 or base_p_inv <= 0:
-                    base_L = str(G_CHOICES[base_findings]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    base_L = str(G_CHOICES[base_findings]) + '\n' \
-                         + '% core involvement: ' + str(base_p_inv)
-                if mid_findings <= 0 or mid_p_inv <= 0:
-                    mid_L = str(G_CHOICES[mid_findings]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    mid_L = str(G_CHOICES[mid_findings]) + '\n' \
-                         + '% core involvement: ' + str(mid_p_inv)
-                if apex_findings <= 0 or apex_p_inv <= 0:
-                    apex_L = str(G_CHOICES[apex_findings]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    apex_L = str(G_CHOICES[apex_findings]) + '\n' \
-                         + '% core involvement: ' + str(apex_p_inv)
-
-                if base_findings_r <= 0 or base_p_inv_r <= 0:
-                    base_R = str(G_CHOICES[base_findings_r]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    base_R = str(G_CHOICES[base_findings_r]) + '\n' \
-                         + '% core involvement: ' + str(base_p_inv_r)
-                if mid_findings_r <= 0 or mid_p_inv_r <= 0:
-                    mid_R = str(G_CHOICES[mid_findings_r]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    mid_R = str(G_CHOICES[mid_findings_r]) + '\n' \
-                         + '% core involvement: ' + str(mid_p_inv_r)
-                if apex_findings_r <= 0 or apex_p_inv_r <= 0:
-                    apex_R = str(G_CHOICES[apex_findings_r]) + '\n' \
-                         + '% core involvement: n/a'
-                else:
-                    apex_R = str(G_CHOICES[apex_findings_r]) + '\n' \
-                         + '% core involvement: ' + str(apex_p_inv_r)
-
-                # Set conditions to show colour coded site images based on Gleason Grade Group for each site
-                draw = ImageDraw.Draw(image)
-                if base_findings == 1:
-                    image_bl_G1 = PIL.Image.open('Images/Base 1.png').convert('RGBA')
-                    image.paste(image_bl_G1, (495, 1615), mask=image_bl_G1)
-                if base_findings == 2:
-                    image_bl_G2 = PIL.Image.open('Images/Base 2.png').convert('RGBA')
-                    image.paste(image_bl_G2, (495, 1615), mask=image_bl_G2)
-                if base_findings == 3:
-                    image_bl_G3 = PIL.Image.open('Images/Base 3.png').convert('RGBA')
-                    image.paste(image_bl_G3, (495, 1615), mask=image_bl_G3)
-                if base_findings == 4:
-                    image_bl_G4 = PIL.Image.open('Images/Base 4.png').convert('RGBA')
-                    image.paste(image_bl_G4, (495, 1615), mask=image_bl_G4)
-                if base_findings == 5:
-                    image_bl_G5 = PIL.Image.open('Images/Base 5.png').convert('RGBA')
-                    image.paste(image_bl_G5, (495, 1615), mask=image_bl_G5)
-
-                if mid_findings == 1:
-                    image_ml_G1 = PIL.Image.open('Images/Mid 1.png').convert('RGBA')
-                    image.paste(image_ml_G1, (495, 965), mask=image_ml_G1)  # 606
-                if mid_findings == 2:
-                    image_ml_G2 = PIL.Image.open('Images/Mid 2.png').convert('RGBA')
-                    image.paste(image_ml_G2, (495, 965), mask=image_ml_G2)
-                if mid_findings == 3:
-                    image_ml_G3 = PIL.Image.open('Images/Mid 3.png').convert('RGBA')
-                    image.paste(image_ml_G3, (495, 965), mask=image_ml_G3)
-                if mid_findings == 4:
-                    image_ml_G4 = PIL.Image.open('Images/Mid 4.png').convert('RGBA')
-                    image.paste(image_ml_G4, (495, 965), mask=image_ml_G4)
-                if mid_findings == 5:
-                    image_ml_G5 = PIL.Image.open('Images/Mid 5.png').convert('RGBA')
-                    image.paste(image_ml_G5, (495, 965), mask=image_ml_G5)
-
-                if apex_findings == 1:
-                    image_al_G1 = PIL.Image.open('Images/Apex 1.png').convert('RGBA')
-                    image.paste(image_al_G1, (495, 187), mask=image_al_G1)
-                if apex_findings == 2:
-                    image_al_G2 = PIL.Image.open('Images/Apex 2.png').convert('RGBA')
-                    image.paste(image_al_G2, (495, 187), mask=image_al_G2)
-                if apex_findings == 3:
-                    image_al_G3 = PIL.Image.open('Images/Apex 3.png').convert('RGBA')
-                    image.paste(image_al_G3, (495, 187), mask=image_al_G3)
-                if apex_findings == 4:
-                    image_al_G4 = PIL.Image.open('Images/Apex 4.png').convert('RGBA')
-                    image.paste(image_al_G4, (495, 187), mask=image_al_G4)
-                if apex_findings == 5:
-                    image_al_G5 = PIL.Image.open('Images/Apex 5.png').convert('RGBA')
-                    image.paste(image_al_G5, (495, 187), mask=image_al_G5)
-
-                if base_findings_r == 1:
-                    image_br_G1 = PIL.ImageOps.mirror(PIL.Image.open('Images/Base 1.png')).convert('RGBA')
-                    image.paste(image_br_G1, (1665, 1615), mask=image_br_G1)
-                if base_findings_r == 2:
-                    image_br_G2 = PIL.ImageOps.mirror(PIL.Image.open('Images/Base 2.png')).convert('RGBA')
-                    image.paste(image_br_G2, (1665, 1615), mask=image_br_G2)
-                if base_findings_r == 3:
-                    image_br_G3 = PIL.ImageOps.mirror(PIL.Image.open('Images/Base 3.png')).convert('RGBA')
-                    image.paste(image_br_G3, (1665, 1615), mask=image_br_G3)
-                if base_findings_r == 4:
-                    image_br_G4 = PIL.ImageOps.mirror(PIL.Image.open('Images/Base 4.png')).convert('RGBA')
-                    image.paste(image_br_G4, (1665, 1615), mask=image_br_G4)
-                if base_findings_r == 5:
-                    image_br_G5 = PIL.ImageOps.mirror(PIL.Image.open('Images/Base 5.png')).convert('RGBA')
-                    image.paste(image_br_G5, (1665, 1615), mask=image_br_G5)
-
-                if mid_findings_r == 1:
-                    image_mr_G1 = PIL.Image.open('Images/Mid 1.png').convert('RGBA')
-                    image.paste(image_mr_G1, (1665, 965), mask=image_mr_G1)
-                if mid_findings_r == 2:
-                    image_mr_G2 = PIL.Image.open('Images/Mid 2.png').convert('RGBA')
-                    image.paste(image_mr_G2, (1665, 965), mask=image_mr_G2)
-                if mid_findings_r == 3:
-                    image_mr_G3 = PIL.Image.open('Images/Mid 3.png').convert('RGBA')
-                    image.paste(image_mr_G3, (1665, 965), mask=image_mr_G3)
-                if mid_findings_r == 4:
-                    image_mr_G4 = PIL.Image.open('Images/Mid 4.png').convert('RGBA')
-                    image.paste(image_mr_G4, (1665, 965), mask=image_mr_G4)
-                if mid_findings_r == 5:
-                    image_mr_G5 = PIL.Image.open('Images/Mid 5.png').convert('RGBA')
-                    image.paste(image_mr_G5, (1665, 965), mask=image_mr_G5)
-
-                if apex_findings_r == 1:
-                    image_ar_G1 = PIL.ImageOps.mirror(PIL.Image.open('Images/Apex 1.png')).convert('RGBA')
-                    image.paste(image_ar_G1, (1665, 187), mask=image_ar_G1)
-                if apex_findings_r == 2:
-                    image_ar_G2 = PIL.ImageOps.mirror(PIL.Image.open('Images/Apex 2.png')).convert('RGBA')
-                    image.paste(image_ar_G2, (1665, 187), mask=image_ar_G2)
-                if apex_findings_r == 3:
-                    image_ar_G3 = PIL.ImageOps.mirror(PIL.Image.open('Images/Apex 3.png')).convert('RGBA')
-                    image.paste(image_ar_G3, (1665, 187), mask=image_ar_G3)
-                if apex_findings_r == 4:
-                    image_ar_G4 = PIL.ImageOps.mirror(PIL.Image.open('Images/Apex 4.png')).convert('RGBA')
-                    image.paste(image_ar_G4, (1665, 187), mask=image_ar_G4)
-                if apex_findings_r == 5:
-                    image_ar_G5 = PIL.ImageOps.mirror(PIL.Image.open('Images/Apex 5.png')).convert('RGBA')
-                    image.paste(image_ar_G5, (1665, 187), mask=image_ar_G5)
-
-                # Overlay text showing Gleason Grade Group, % positive cores, and % core involvement for each site
-                draw.text((655, 1920), base_L, fill="black", font=font, align="center")
-                draw.text((655, 1190), mid_L, fill="black", font=font, align="center")
-                draw.text((735, 545), apex_L, fill="black", font=font, align="center")
-                draw.text((1850, 1920), base_R, fill="black", font=font, align="center")
-                draw.text((1850, 1190), mid_R, fill="black", font=font, align="center")
-                draw.text((1770, 545), apex_R, fill="black", font=font, align="center")
+                inputs = (age, psa, vol, p_high, perineural_inv, base_findings, base_p_inv, mid_findings, mid_p_inv,
+                          apex_findings, apex_p_inv, pos_core, taken_core, base_findings_r, base_p_inv_r, mid_findings_r,
+                          mid_p_inv_r, apex_findings_r, apex_p_inv_r, pos_core_r, taken_core_r)
+                (left_p, right_p, pos_ssEPE, similar_cases, pos_ssEPE_r, similar_cases_r,
+                 prostate_png) = render_results(model, inputs)
 
                 col4, col5 = st.columns([1, 2])
-                left_prob = str((model.predict_proba(pt_features)[:, 1] * 100).round())[1:-2]
-                right_prob = str((model.predict_proba(pt_features_r)[:, 1] * 100).round())[1:-2]
-
-                ### SIMILAR CASE FINDER ###
-                query = data[(data['Age at Biopsy'].between(pt_features['Age at Biopsy'][0] - 5,
-                                                       pt_features['Age at Biopsy'][0] + 5)) &
-                             (data['Worst Gleason Grade Group'] == pt_features['Worst Gleason Grade Group'][0]) &
-                             (data['PSA density'].between(pt_features['PSA density'][0] * 0.7,
-                                                        pt_features['PSA density'][0] * 1.3)) &
-                             (data['Perineural invasion'] == pt_features['Perineural invasion'][0]) &
-                             (data['% positive cores'].between(pt_features['% positive cores'][0] - 10,
-                                                             pt_features['% positive cores'][0] + 10)) &
-                             (data['% Gleason pattern 4/5'].between(pt_features['% Gleason pattern 4/5'][0] - 10,
-                                                                  pt_features['% Gleason pattern 4/5'][0] + 10)) &
-                             (data['Max % core involvement'].between(pt_features['Max % core involvement'][0] - 10,
-                                                                   pt_features['Max % core involvement'][0] + 10))
-                             ]
-                pos_ssEPE = sum(query['ssEPE'])
-                similar_cases = len(query['ssEPE'])
-
-                query_r = data[(data['Age at Biopsy'].between(pt_features_r['Age at Biopsy'][0] - 5,
-                                                            pt_features_r['Age at Biopsy'][0] + 5)) &
-                             (data['Worst Gleason Grade Group'] == pt_features_r['Worst Gleason Grade Group'][0]) &
-                             (data['PSA density'].between(pt_features_r['PSA density'][0] * 0.7,
-                                                          pt_features_r['PSA density'][0] * 1.3)) &
-                             (data['Perineural invasion'] == pt_features_r['Perineural invasion'][0]) &
-                             (data['% positive cores'].between(pt_features_r['% positive cores'][0] - 10,
-                                                               pt_features_r['% positive cores'][0] + 10)) &
-                             (data['% Gleason pattern 4/5'].between(pt_features_r['% Gleason pattern 4/5'][0] - 10,
-                                                                    pt_features_r['% Gleason pattern 4/5'][0] + 10)) &
-                             (data['Max % core involvement'].between(pt_features_r['Max % core involvement'][0] - 10,
-                                                                     pt_features_r['Max % core involvement'][0] + 10))
-                             ]
-                pos_ssEPE_r = sum(query_r['ssEPE'])
-                similar_cases_r = len(query_r['ssEPE'])
+                left_prob = str((left_p * 100).round())[1:-2]
+                right_prob = str((right_p * 100).round())[1:-2]
 
                 ### DISPLAY RESULTS ###
                 col4.header('Your Results')
                 col4.subheader('Probability of LEFT extraprostatic extension: {}%'.format(left_prob))
                 col4.caption('For every 10 patients with your disease profile, about {} patients will have tumour that '
                              'has extended beyond the left side of the prostate.'
-                             .format(str((model.predict_proba(pt_features)[:, 1] * 10).round())[1:-2]))
+                             .format(str((left_p * 10).round())[1:-2]))
                 if similar_cases == 0:
                     col4.caption('No patients with similar characteristics were found in our database.')
                 else:
@@ -410,7 +359,7 @@ def page_sepera():
                 col4.subheader('Probability of RIGHT extraprostatic extension: {}%'.format(right_prob))
                 col4.caption('For every 10 patients with your disease profile, about {} patients will have tumour that '
                              'has extended beyond the right side of the prostate.'
-                           .format(str((model.predict_proba(pt_features_r)[:, 1] * 10).round())[1:-2]))
+                           .format(str((right_p * 10).round())[1:-2]))
                 if similar_cases_r == 0:
                     col4.caption('No patients with similar characteristics were found in our database.')
                 else:
@@ -418,7 +367,7 @@ def page_sepera():
                                  "on the right side had right extraprostatic extension."
                                  .format(pos_ssEPE_r, similar_cases_r, round((pos_ssEPE_r/similar_cases_r)*100)))
                 col5.header('Prostate Diagram')
-                col5.image(image, use_column_width=True)
+                col5.image(prostate_png, use_column_width=True)
 
 
 
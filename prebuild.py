@@ -0,0 +1,35 @@
+"""
+Download the trained SEPERA model and the reference data ahead of time, so that the first visit to the app does not
+have to wait for them. Run from the repository root, e.g. when building the container:
+
+    python prebuild.py
+"""
+
+# Import packages and libraries
+import streamlit as st
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from google_drive_downloader import GoogleDriveDownloader as gdd
+
+# Where the model and the reference data are saved, load_items() in SEPERA.py loads them from here
+MODEL_CHECKPOINT = Path('model/SEPERA.pkl')
+DATA_CHECKPOINT = Path('model/data.pkl')
+
+
+def download_items(model_location, data_location):
+    """Download the model and the reference data from Google Drive if they are not present, both files are downloaded
+    at the same time. Returns the model and data checkpoints."""
+    MODEL_CHECKPOINT.parent.mkdir(exist_ok=True)
+    downloads = [(location, checkpoint) for location, checkpoint in
+                 [(model_location, MODEL_CHECKPOINT), (data_location, DATA_CHECKPOINT)] if not checkpoint.exists()]
+    if downloads:
+        with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+            futures = [executor.submit(gdd.download_file_from_google_drive, location, checkpoint)
+                       for location, checkpoint in downloads]
+            for future in futures:
+                future.result()
+    return MODEL_CHECKPOINT, DATA_CHECKPOINT
+
+
+if __name__ == "__main__":
+    download_items(st.secrets['SEPERA'], st.secrets['Data'])